@@ -1,33 +1,91 @@
 #!/usr/bin/env python3
 import argparse
+import atexit
+import bisect
+import fnmatch
+import functools
 import glob
+import json
+import math
 import os
 import re
 import shlex
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
 from datetime import datetime
 import shutil
-from pathlib import Path
 
 # Configuration
 
 CAM_DIR = "Camera"
 REMOTE_DIR = "/storage/emulated/0/DCIM/Camera"
 LOCAL_DIR = os.path.expanduser("~/Pictures/Camera") # For sync functionality
-TODAY = datetime.now().strftime("%Y%m%d")
 LATEST_DATE_CONST = "LATEST_DATE"
 DEFAULT_FONT_PATH = "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc"
+# 代表「要執行某個模式」的參數名稱 (argparse dest)；都沒給時顯示說明
+MODE_FLAGS = ("last", "date", "info", "merge", "shorten", "slice", "shrink", "text",
+              "sync", "push", "mute", "clear_cache")
+PULL_BATCH_SIZE = 100  # 同步時一次 adb pull 的檔案數上限
+PULL_WORKERS = 4  # 同步時同時進行的 adb pull 數量 (可用 --jobs 調整)
+VAAPI_DEVICE = "/dev/dri/renderD128"
+GPU_JOBS = 2  # 使用 --hwaccel 時 --jobs 的預設值：消費級 GPU 同時只能開少數幾個編碼 session (NVENC 約 3~5 個)
+# ffmpeg/ffprobe/adb 只在啟動時查一次 PATH；找不到時保留原名，由 check_ffmpeg/check_adb 提早報錯
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+# 所有轉檔用的 ffmpeg 都以此開頭：不印版本/編譯設定，也不從終端機讀取按鍵 (--jobs 同時跑多個時不會搶 stdin)；
+# 只印錯誤、不印逐格進度，--jobs 同時跑多個時輸出也不會混在一起
+FFMPEG_BASE = [FFMPEG, "-hide_banner", "-nostdin", "-loglevel", "error", "-nostats"]
+ADB = shutil.which("adb") or "adb"
+PROBE_CACHE_FILE = os.path.expanduser("~/.cache/camtools/probe.json")
+
+# 預先編譯的正規表示式
+_DATE_RE = re.compile(r'(?:[A-Za-z]+_)?(\d{8})')  # 檔名開頭的 YYYYmmdd (可有 VID_/IMG_/PXL_ 等前綴)
+_RES_RE = re.compile(r'^\d+x\d+$')  # --shrink 的 WxH
+_YMD_RE = re.compile(r'^\d{8}$')  # --last 的 YYYYmmdd
+_UNSAFE_TAG_RE = re.compile(r'[^\w\-]')  # 輸出檔名中不安全的字元
+_TIME_RE = re.compile(r'^(?:(\d+):)?(\d+(?:\.\d*)?|\.\d+)$')  # --slice 的 mm:ss.ms 或 ss.ms
+
+_probe_cache = None  # ffprobe 結果的磁碟快取 (path:size:mtime_ns -> {...})，第一次使用時才載入
+_probe_cache_dirty = False
+_probe_cache_lock = threading.Lock()  # 平行 probe 時避免重複載入快取
+_probe_cache_clearers = []  # 各 probe 函式的 lru_cache.cache_clear，供 --clear-cache 使用
 
 # -------------------
 # 工具函式
 # -------------------
+def today():
+    """今天的日期 (YYYYmmdd)；在建立輸出檔名時才取值，跨過午夜執行也不會用到舊日期。"""
+    return datetime.now().strftime("%Y%m%d")
+
+def has_wildcard(pattern):
+    """pattern 是否含有 glob 萬用字元 (* ? [)。"""
+    return any(c in pattern for c in "*?[")
+
+def list_dir_files(directory):
+    """用一次 os.scandir 列出 directory 下的檔名 (僅檔案，已排序)；目錄不存在則回傳空 list。"""
+    try:
+        with os.scandir(directory) as it:
+            return sorted(e.name for e in it if e.is_file())
+    except OSError:
+        return []
+
 def find_files(exts):
-    """在 CAM_DIR 尋找特定副檔名檔案，用於 --last 和 --date 統計模式。"""
-    files = []
-    for ext in exts:
-        files.extend(glob.glob(os.path.join(CAM_DIR, f"*.{ext}")))
-    return files
+    """在 CAM_DIR 尋找特定副檔名檔案 (不分大小寫)，用於 --last 和 --date 統計模式。
+    只 scandir 一次再比對副檔名，不必每個副檔名各 glob 一次；不分大小寫也避免同一檔案被算兩次。
+    """
+    suffixes = tuple({"." + ext.lower() for ext in exts})
+    return [os.path.join(CAM_DIR, n) for n in list_dir_files(CAM_DIR)
+            if not n.startswith(".") and n.lower().endswith(suffixes)]
+
+@functools.lru_cache(maxsize=None)
+def compile_name_pattern(name_pattern):
+    """把檔名萬用字元編譯成 regex；同一個 pattern 在整次執行只編譯一次。"""
+    return re.compile(fnmatch.translate(name_pattern))
 
 def resolve_files(patterns, require_mp4=True):
     """
@@ -35,9 +93,10 @@ def resolve_files(patterns, require_mp4=True):
     - 搜尋路徑: Camera/ 和 ./
     - 預設副檔名: .mp4 (如果 require_mp4 為 True)
     - 保持使用者輸入的順序，並排除重複檔案。
+    每個搜尋目錄只 scandir 一次並快取檔名，之後所有 pattern 都比對這份快取。
     """
-    ordered_files = []
-    seen = set()
+    ordered_files = {}  # dict 保留插入順序，同時當作去重用的集合
+    dir_cache = {}  # 目錄 -> (排序後檔名 list, 檔名 set)
 
     for pattern in patterns:
         base, ext = os.path.splitext(pattern)
@@ -50,159 +109,638 @@ def resolve_files(patterns, require_mp4=True):
             
         # 暫存這一個 pattern 找到的檔案
         matched_for_pattern = []
-        
-        # 搜尋當前目錄和 Camera/
-        for search_dir in ['.', CAM_DIR]:
-            if os.path.isabs(pattern_to_search):
-                if os.path.isfile(pattern_to_search):
-                    matched_for_pattern.append(pattern_to_search)
-                break
-            
-            full_pattern = os.path.join(search_dir, pattern_to_search)
-            for f in glob.glob(full_pattern, recursive=False):
-                if os.path.isfile(f):
-                    matched_for_pattern.append(f)
+        sub_dir, name_pattern = os.path.split(pattern_to_search)
+
+        if os.path.isabs(pattern_to_search):
+            if os.path.isfile(pattern_to_search):
+                matched_for_pattern.append(pattern_to_search)
+        elif has_wildcard(sub_dir):
+            # 目錄部分也有萬用字元時，交給 glob 處理
+            for search_dir in ['.', CAM_DIR]:
+                for f in glob.glob(os.path.join(search_dir, pattern_to_search)):
+                    if os.path.isfile(f):
+                        matched_for_pattern.append(f)
+        else:
+            if has_wildcard(name_pattern):
+                regex = compile_name_pattern(name_pattern)
+                # 與 glob 一致：* 與 ? 不匹配以 . 開頭的隱藏檔
+                allow_hidden = name_pattern.startswith(".")
+            # 搜尋當前目錄和 Camera/
+            for search_dir in ['.', CAM_DIR]:
+                directory = os.path.join(search_dir, sub_dir) if sub_dir else search_dir
+                if directory not in dir_cache:
+                    names = list_dir_files(directory)
+                    dir_cache[directory] = (names, set(names))
+                names, name_set = dir_cache[directory]
+                if has_wildcard(name_pattern):
+                    for n in names:
+                        if regex.match(n) and (allow_hidden or not n.startswith(".")):
+                            matched_for_pattern.append(os.path.join(directory, n))
+                elif name_pattern in name_set:
+                    # 沒有萬用字元：直接查 set，O(1)
+                    matched_for_pattern.append(os.path.join(directory, name_pattern))
                     
         # 針對這一個 pattern 找到的檔案進行排序 
         # (確保當使用萬用字元如 20260301* 時，展開的這批檔案能照時間/字母順序排列)
         matched_for_pattern.sort()
 
-        # 依序加入最終清單，並利用 seen 集合過濾掉已經加入過的檔案
+        # 依序加入最終清單；已經加入過的檔案 setdefault 不會改變它原本的位置
         for f in matched_for_pattern:
             # 正規化路徑 (把 ./file.mp4 轉成 file.mp4)，避免路徑寫法不同造成重複計算
-            norm_f = os.path.normpath(f)
-            if norm_f not in seen:
-                seen.add(norm_f)
-                ordered_files.append(norm_f)
+            ordered_files.setdefault(os.path.normpath(f))
 
-    return ordered_files
+    return list(ordered_files)
 
 def extract_date(filename):
     basename = os.path.basename(filename)
-    m = re.match(r'(?:VID_)?(\d{8})', basename)
+    m = _DATE_RE.match(basename)
     return m.group(1) if m else None
 
+def load_probe_cache():
+    """讀取磁碟上的 ffprobe 結果快取 (只在第一次呼叫時讀檔)，結束時自動寫回。"""
+    global _probe_cache
+    with _probe_cache_lock:
+        if _probe_cache is None:
+            try:
+                with open(PROBE_CACHE_FILE) as f:
+                    _probe_cache = json.load(f)
+            except (OSError, ValueError):
+                _probe_cache = {}
+            atexit.register(save_probe_cache)
+    return _probe_cache
+
+def prune_probe_cache(cache):
+    """移除檔案已刪除或已改寫 (size/mtime 不同) 的項目，避免快取檔隨時間無限增長。"""
+    stale = []
+    for key in cache:
+        # key 為 abspath:size:mtime_ns，路徑本身可能含有 ":"，所以從右邊切
+        path, size, mtime_ns = key.rsplit(":", 2)
+        try:
+            st = os.stat(path)
+        except OSError:
+            stale.append(key)
+            continue
+        if f"{st.st_size}:{st.st_mtime_ns}" != f"{size}:{mtime_ns}":
+            stale.append(key)
+    for key in stale:
+        del cache[key]
+
+def save_probe_cache():
+    """有新的 ffprobe 結果時才寫回磁碟快取；先寫暫存檔再 os.replace，避免中斷時留下半個 JSON。"""
+    global _probe_cache_dirty
+    if not _probe_cache_dirty:
+        return
+    prune_probe_cache(_probe_cache)
+    tmp_file = f"{PROBE_CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(PROBE_CACHE_FILE), exist_ok=True)
+        with open(tmp_file, "w") as f:
+            json.dump(_probe_cache, f)
+        os.replace(tmp_file, PROBE_CACHE_FILE)
+        _probe_cache_dirty = False
+    except OSError:
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+
+def clear_probe_cache():
+    """刪除磁碟快取並清空記憶體中的快取。"""
+    global _probe_cache, _probe_cache_dirty
+    with _probe_cache_lock:
+        _probe_cache = {}
+        _probe_cache_dirty = False
+    for clear in _probe_cache_clearers:
+        clear()
+    if os.path.exists(PROBE_CACHE_FILE):
+        os.remove(PROBE_CACHE_FILE)
+
+class ProbeFailed(Exception):
+    """probe_cached 內部使用：被裝飾的函式 probe 失敗。"""
+
+def probe_cached(default):
+    """
+    ffprobe 結果快取的裝飾器，以 (絕對路徑, size, mtime_ns) 為 key：
+    - L1: functools.lru_cache，同一次執行內不重複 probe
+    - L2: ~/.cache/camtools/probe.json，之後再執行也只需要 stat
+    被裝飾的函式回傳 None 代表 probe 失敗，改回傳 default；失敗在 L1/L2 都不會被快取，下次呼叫會重試。
+    檔案被改寫後 size/mtime 不同，舊的快取自然失效。
+    """
+    def decorator(func):
+        name = func.__name__
+
+        @functools.lru_cache(maxsize=4096)
+        def cached(abspath, size, mtime_ns):
+            global _probe_cache_dirty
+            cache = load_probe_cache()
+            key = f"{abspath}:{size}:{mtime_ns}"
+            entry = cache.get(key)
+            if entry is not None and name in entry:
+                value = entry[name]
+                # JSON 沒有 tuple，存回來會變成 list
+                return tuple(value) if isinstance(value, list) else value
+            value = func(abspath)
+            if value is None:
+                # lru_cache 不會快取例外，丟出例外讓這次失敗不進 L1
+                raise ProbeFailed(abspath)
+            cache.setdefault(key, {})[name] = value
+            _probe_cache_dirty = True
+            return value
+
+        @functools.wraps(func)
+        def wrapper(file_path):
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                return default
+            try:
+                return cached(os.path.abspath(file_path), st.st_size, st.st_mtime_ns)
+            except ProbeFailed:
+                return default
+
+        _probe_cache_clearers.append(cached.cache_clear)
+        return wrapper
+    return decorator
+
+EMPTY_PROBE = {"duration": 0.0, "width": None, "height": None, "has_audio": False, "vcodec": None}
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+@probe_cached(default=EMPTY_PROBE)
+def probe(file_path):
+    """
+    一次 ffprobe 取得影片所需的所有資訊 (長度、解析度、是否有音軌、影像編碼)，結果經 probe_cached 快取。
+    回傳 dict: {duration, width, height, has_audio, vcodec}；呼叫端請勿修改回傳的 dict。
+    format 沒有 duration 時改用各串流中最長的 duration。
+    MP4 先在行程內解析 moov (mp4_probe_fast)，解析不出來才啟動 ffprobe。
+    """
+    if file_path.lower().endswith(".mp4"):
+        fast = mp4_probe_fast(file_path)
+        if fast is not None:
+            return fast
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-print_format", "json",
+         # 只要求用得到的欄位，ffprobe 不必輸出 (我們也不必解析) 完整的 format/stream 資訊
+         "-show_entries", "format=duration:stream=codec_type,codec_name,width,height,duration",
+         file_path],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        info = json.loads(result.stdout)
+    except ValueError:
+        return None
+
+    streams = info.get("streams") or []
+    video = next((st for st in streams if st.get("codec_type") == "video"), {})
+    duration = _to_float(info.get("format", {}).get("duration"))
+    if duration is None:
+        stream_durations = [d for d in (_to_float(st.get("duration")) for st in streams) if d is not None]
+        duration = max(stream_durations, default=0.0)
+    width = video.get("width")
+    height = video.get("height")
+    return {
+        "duration": duration,
+        "width": width if isinstance(width, int) else None,
+        "height": height if isinstance(height, int) else None,
+        "has_audio": any(st.get("codec_type") == "audio" for st in streams),
+        "vcodec": video.get("codec_name"),
+    }
+
 def get_duration(file_path):
     """取得影片長度（秒）"""
-    out = subprocess.run(
-        ["ffprobe", "-v", "error", "-show_entries", "format=duration",
-         "-of", "default=noprint_wrappers=1:nokey=1", file_path],
-        capture_output=True, text=True
-    )
+    return probe(file_path)["duration"]
+
+def map_parallel(func, items):
+    """
+    以執行緒池平行執行 func，回傳順序與 items 相同的結果 list。
+    用於每個檔案各跑一次 ffprobe 的情境：外部行程等待時不佔 GIL，總時間約等於最慢的那一個。
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    max_workers = min(32, (os.cpu_count() or 1) * 4, len(items))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
+
+def default_jobs(hwaccel="none"):
+    """
+    --jobs 預設值：每個 ffmpeg 自己就會用多執行緒，只開核心數的 1/4 避免過度搶 CPU；
+    硬體編碼時受限於 GPU 的編碼 session 數，改為 GPU_JOBS。
+    """
+    if hwaccel != "none":
+        return GPU_JOBS
+    return max(1, (os.cpu_count() or 1) // 4)
+
+def run_jobs(func, items, jobs, label):
+    """
+    同時以最多 jobs 個工作處理 items (每個 item 各跑一個 ffmpeg)；jobs 為 None 時使用 default_jobs()。
+    單一檔案失敗不會中斷其他檔案，最後列出失敗數量；回傳失敗的 (item, 例外) list。
+    """
+    items = list(items)
+    jobs = jobs or default_jobs()
+    failures = []
+    def task(item):
+        try:
+            func(item)
+        except subprocess.CalledProcessError as e:
+            print(f"{label}失敗 {item}: {e}")
+            failures.append((item, e))
+    if jobs <= 1 or len(items) <= 1:
+        for item in items:
+            task(item)
+    else:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(items))) as executor:
+            list(executor.map(task, items))
+    if failures:
+        print(f"⚠️ {len(failures)}/{len(items)} 個檔案{label}失敗")
+    return failures
+
+# stsd 的 sample entry 類型 -> ffprobe 的 codec_name
+MP4_VIDEO_CODECS = {
+    b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc",
+    b"av01": "av1", b"vp09": "vp9", b"mp4v": "mpeg4",
+}
+
+def parse_mp4_box_header(buf, pos, end):
+    """解析 buf[pos:] 的 box 標頭，回傳 (類型, 標頭長度, box 大小)；size 為 0 代表延伸到 end。"""
+    size, box_type = struct.unpack_from(">I4s", buf, pos)
+    header = 8
+    if size == 1:
+        size = struct.unpack_from(">Q", buf, pos + 8)[0]
+        header = 16
+    elif size == 0:
+        size = end - pos
+    return box_type, header, size
+
+def iter_mp4_boxes(buf, start, end):
+    """走訪 buf[start:end] 中同一層的 box，產生 (類型, 內容開始, 內容結束)。"""
+    pos = start
+    while pos + 8 <= end:
+        box_type, header, size = parse_mp4_box_header(buf, pos, end)
+        if size < header or pos + size > end:
+            return
+        yield box_type, pos + header, pos + size
+        pos += size
+
+def find_mp4_box(buf, start, end, path):
+    """依 path (例如 [b"mdia", b"hdlr"]) 逐層往下找第一個符合的 box，回傳 (內容開始, 內容結束) 或 None。"""
+    for name in path:
+        for box_type, start, end in iter_mp4_boxes(buf, start, end):
+            if box_type == name:
+                break
+        else:
+            return None
+    return start, end
+
+def read_mp4_moov(file_path):
+    """只讀標頭並 seek 跳過其他 box，找到 moov 後讀入它的完整內容 (bytes)；找不到回傳 None。"""
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        pos = 0
+        while pos + 8 <= file_size:
+            f.seek(pos)
+            # 最多 16 bytes 就包含完整標頭 (含 64-bit size)
+            box_type, header, size = parse_mp4_box_header(f.read(16), 0, file_size - pos)
+            if size < header:
+                return None
+            if box_type == b"moov":
+                f.seek(pos + header)
+                return f.read(size - header)
+            pos += size
+    return None
+
+def mp4_probe_fast(file_path):
+    """
+    不啟動 ffprobe，在行程內解析 MP4 的 moov 取得與 probe() 相同的 dict：
+    長度取自 mvhd，各 trak 以 hdlr 判斷影像/聲音，解析度與編碼取自影像 trak 的 stsd。
+    非 MP4、檔案損毀、fragmented MP4 (mvhd 長度為 0) 時回傳 None，由呼叫端改用 ffprobe。
+    """
     try:
-        return float(out.stdout.strip())
-    except:
-        return 0.0
+        moov = read_mp4_moov(file_path)
+        if not moov:
+            return None
+        mvhd = find_mp4_box(moov, 0, len(moov), [b"mvhd"])
+        if mvhd is None:
+            return None
+        start = mvhd[0]
+        if moov[start] == 1:
+            timescale, duration = struct.unpack_from(">IQ", moov, start + 20)
+        else:
+            timescale, duration = struct.unpack_from(">II", moov, start + 12)
+        if not timescale or not duration:
+            return None
+        result = {"duration": duration / timescale, "width": None, "height": None,
+                  "has_audio": False, "vcodec": None}
+        for box_type, trak_start, trak_end in iter_mp4_boxes(moov, 0, len(moov)):
+            if box_type != b"trak":
+                continue
+            hdlr = find_mp4_box(moov, trak_start, trak_end, [b"mdia", b"hdlr"])
+            handler = moov[hdlr[0] + 8:hdlr[0] + 12] if hdlr else b""
+            if handler == b"soun":
+                result["has_audio"] = True
+            elif handler == b"vide" and result["vcodec"] is None:
+                stsd = find_mp4_box(moov, trak_start, trak_end, [b"mdia", b"minf", b"stbl", b"stsd"])
+                if stsd is None:
+                    return None
+                # stsd: version/flags(4) + entry_count(4)，接著第一個 VisualSampleEntry
+                entry = stsd[0] + 8
+                fourcc = moov[entry + 4:entry + 8]
+                width, height = struct.unpack_from(">HH", moov, entry + 32)
+                result.update(width=width, height=height,
+                              vcodec=MP4_VIDEO_CODECS.get(fourcc, fourcc.decode("latin-1")))
+        return result
+    except (OSError, struct.error, IndexError):
+        return None
 
 def show_last(files, target_date=None):
     """ 顯示最新日期或指定日期的影片清單，並依檔名排序。 """
    
+    # 一次走訪建立 {日期: [檔案]}，每個檔案只取一次 basename
+    by_date = {}
+    for f in files:
+        name = os.path.basename(f)
+        if target_date:
+            # 指定日期時用子字串比對：檔名中任何位置含有該日期都算
+            if target_date in name:
+                by_date.setdefault(target_date, []).append(f)
+        else:
+            m = _DATE_RE.match(name)
+            if m:
+                by_date.setdefault(m.group(1), []).append(f)
+
     if target_date:
         print(f"🔹 顯示指定日期 {target_date} 的影片清單:")
         date_to_show = target_date
     else:
-        dates = sorted({extract_date(f) for f in files if extract_date(f)})
-        if not dates:
+        if not by_date:
             print("沒有找到符合的影片檔案")
             return
-        date_to_show = dates[-1]
+        date_to_show = max(by_date)
         print(f"🔹 顯示最新日期 {date_to_show} 的影片清單:")
        
-    matched = [f for f in files if date_to_show in os.path.basename(f)]
+    matched = by_date.get(date_to_show, [])
    
     if not matched:
         print(f"在 {CAM_DIR} 中沒有找到日期為 {date_to_show} 的影片檔案。")
         return
     # 依檔名排序
     matched.sort(key=os.path.basename)
-    for f in matched:
-        dur = get_duration(f)
+    for f, dur in zip(matched, map_parallel(get_duration, matched)):
         print(f"{f} ({dur:.2f}s)")
     print(f"總數: {len(matched)}")
 
 def show_date(files):
     """ 顯示所有檔案按日期的數量統計，並依日期排序。 """
    
-    all_files = find_files(["mp4", "heic", "HEIC", "jpg", "JPG", "jpeg", "JPEG"])
-    date_counts = {}
-   
-    for f in all_files:
-        d = extract_date(f)
-        if d:
-            date_counts[d] = date_counts.get(d, 0) + 1
+    all_files = find_files(["mp4", "heic", "jpg", "jpeg"])
+    date_counts = Counter(d for d in map(extract_date, all_files) if d)
            
     if not date_counts:
         print("沒有找到符合日期的檔案")
         return
        
     # 依日期 (YYYYmmdd) 排序
-    sorted_dates = sorted(date_counts.keys())
-   
     print("🔹 所有檔案按日期的數量統計:")
-    for d in sorted_dates:
-        print(f"{d} = {date_counts[d]}")
-
-def build_concat_file(files):
-    list_file = os.path.join("/tmp", f"fflist.{os.getpid()}.txt")
-    with open(list_file, "w") as f:
-        for file_path in files:
-            f.write(f"file '{os.path.abspath(file_path)}'\n")
-    return list_file
-
-def shorten_video(input_file, target_seconds):
-    """縮短影片至目標秒數。會覆蓋 input_file。"""
+    for d, count in sorted(date_counts.items()):
+        print(f"{d} = {count}")
+
+def overwrite_opts(overwrite):
+    """輸出檔已存在時：overwrite 為 True 覆蓋 (-y)，否則不覆蓋並失敗 (-n)。"""
+    return ["-y"] if overwrite else ["-n"]
+
+def concat_quote(path):
+    """依 ffmpeg concat 格式以單引號包住路徑，路徑內的 ' 轉成 '\\''。"""
+    return "'" + path.replace("'", "'\\''") + "'"
+
+# -c copy 只需要 MP4 moov 內的串流參數，不必讓 ffmpeg 預設先讀 5MB/5 秒來分析輸入
+COPY_PROBE_OPTS = ["-probesize", "32k", "-analyzeduration", "0", "-fpsprobesize", "0"]
+
+# concat 清單由 stdin 餵給 ffmpeg，不寫暫存檔；清單內是檔案路徑，所以要同時允許 pipe 與 file 協定
+CONCAT_STDIN_INPUT = ["-f", "concat", "-safe", "0", "-protocol_whitelist", "pipe,file", "-i", "pipe:0"]
+
+def build_concat_list(files):
+    """產生 ffmpeg concat 清單內容 (bytes)，搭配 CONCAT_STDIN_INPUT 以 input= 傳入。
+    清單從 stdin 讀入，相對路徑無從解析，所以一律轉成絕對路徑；cwd 只取一次。
+    """
+    cwd = os.getcwd()
+    return os.fsencode("\n".join(
+        f"file {concat_quote(p if os.path.isabs(p) else os.path.join(cwd, p))}" for p in files) + "\n")
+
+RUBBERBAND_MAX_TEMPO = 100  # rubberband 的 tempo 只接受 0.01~100，超過就改用 atempo 串接
+
+def build_atempo_filters(speed):
+    """
+    聲音加速的濾鏡串。ffmpeg 有編入 rubberband 且倍速在它的範圍內時只用一段 rubberband (保持音高)；
+    否則單一 atempo 最多 2 倍速：直接算出需要幾段 atempo=2.0，再補上一段餘數。
+    """
+    if speed <= RUBBERBAND_MAX_TEMPO and "rubberband" in available_filters():
+        return [f"rubberband=tempo={speed}"]
+    n = max(0, math.ceil(math.log2(speed)) - 1) if speed > 2.0 else 0
+    rem = speed / (2 ** n)
+    return ["atempo=2.0"] * n + ([f"atempo={rem}"] if rem > 0.01 else [])
+
+def has_audio_stream(file_path):
+    """檢查影片是否含有音軌"""
+    return probe(file_path)["has_audio"]
+
+def is_near_integer_speed(speed):
+    """speed 是否接近 >=2 的整數倍 (--fast-shorten 只在這種倍速下改用 -itsscale)。"""
+    return speed >= 1.95 and abs(speed - round(speed)) < 0.05
+
+def build_shorten_cmd(input_args, duration, target_seconds, has_audio, output_file, hwaccel="none"):
+    """產生縮短用的 ffmpeg 指令 (影像 setpts、聲音 atempo)；input_args 例如 ["-i", 檔名]。
+    倍速接近整數 M 時先用 select 每 M 個影格只留一個，再以 N/FRAME_RATE 重排時間戳：
+    輸出維持原本的影格率，濾鏡與編碼器也只需處理 1/M 的影格。
+    """
+    speed = duration / target_seconds
+    input_opts, vf_suffix, codec = encoder_args(hwaccel)
+    if is_near_integer_speed(speed):
+        speed = round(speed)
+        pts_str = f"select='not(mod(n,{speed}))',setpts=N/(FRAME_RATE*TB){vf_suffix}"
+    else:
+        pts_str = f"setpts={1/speed}*PTS{vf_suffix}"
+    atempo_filters = build_atempo_filters(speed)
+    cmd = FFMPEG_BASE + ["-y"] + input_opts + input_args
+    if has_audio and atempo_filters:
+        filter_complex = f"[0:v]{pts_str}[v];[0:a]{','.join(atempo_filters)}[a]"
+        cmd.extend(["-filter_complex", filter_complex, "-map", "[v]", "-map", "[a]"])
+    else:
+        cmd.extend(["-filter_complex", f"[0:v]{pts_str}[v]", "-map", "[v]", "-an"])
+    return cmd + codec + [output_file]
+
+def build_itsscale_cmd(input_file, speed, has_audio, output_file):
+    """
+    整數倍速的快速縮短 (--fast-shorten)：-itsscale 直接縮放輸入的時間戳，影像 -c:v copy 不解碼也不重新編碼。
+    聲音另外以未縮放的第二個輸入經 atempo 處理，避免時間戳被壓縮後音訊錯亂。
+    注意每個原始影格都會保留，輸出的影格率是原本的 speed 倍 (30fps 的 4 倍速就是 120fps)，
+    有些播放器/手機會播放不順，所以只在使用者明確指定時才使用。
+    """
+    cmd = FFMPEG_BASE + ["-y", "-itsscale", str(1 / speed), "-i", input_file]
+    if has_audio:
+        cmd.extend(["-i", input_file, "-map", "0:v", "-map", "1:a",
+                    "-af", ",".join(build_atempo_filters(speed))])
+    else:
+        cmd.extend(["-map", "0:v"])
+    return cmd + ["-c:v", "copy", output_file]
+
+def make_temp_output(output_file, mode_source):
+    """
+    在 output_file 同一個目錄建立暫存輸出檔，完成後只需 os.replace (同檔案系統的 rename，不複製資料)；
+    輸出檔同時也是輸入檔時，ffmpeg 就不會邊讀邊把它截斷。
+    mkstemp 保證檔名唯一，同時執行多個 camera.py (或 --jobs) 時不會互相覆蓋。
+    """
+    base, ext = os.path.splitext(output_file)
+    fd, tmp_out = tempfile.mkstemp(prefix=os.path.basename(base) + ".shortening.", suffix=ext or ".mp4",
+                                   dir=os.path.dirname(output_file) or ".")
+    os.close(fd)
+    shutil.copymode(mode_source, tmp_out)  # mkstemp 建立的是 0600，改成與原檔相同的權限
+    return tmp_out
+
+def shorten_video(input_file, target_seconds, output_file=None, hwaccel="none", fast=False):
+    """縮短影片至目標秒數並輸出到 output_file；未指定 output_file 時會覆蓋 input_file。
+    fast=True 且倍速接近整數時改用 -itsscale (影像不重新編碼)，其餘一律以 setpts 重新編碼。
+    """
+    output_file = output_file or input_file
     duration = get_duration(input_file)
     if duration <= target_seconds:
         print(f"總長度 {duration:.2f}s <= {target_seconds}s，不需要縮短")
+        if os.path.abspath(output_file) != os.path.abspath(input_file):
+            shutil.copyfile(input_file, output_file)
         return
     print(f"總長度 {duration:.2f}s > {target_seconds}s，開始縮短 (目標 {target_seconds}s)")
-    v_speed = duration / target_seconds
-    a_speed = duration / target_seconds
-    out = subprocess.run(
-        ["ffprobe", "-v", "error", "-select_streams", "a",
-         "-show_entries", "stream=index", "-of", "csv=p=0", input_file],
-        capture_output=True, text=True
-    )
-    has_audio = bool(out.stdout.strip())
-    a_speed_f = a_speed
-    atempo_filters = []
-    while a_speed_f > 2.0:
-        atempo_filters.append("atempo=2.0")
-        a_speed_f /= 2.0
-    if a_speed_f > 0.01:
-        atempo_filters.append(f"atempo={a_speed_f}")
-   
-    atempo_str = ",".join(atempo_filters)
-    pts_str = f"setpts={1/v_speed}*PTS"
-    tmp_out = f"/tmp/shortened.{os.getpid()}.mp4"
-    cmd = ["ffmpeg", "-y", "-i", input_file]
-   
-    if has_audio and atempo_filters:
-        filter_complex = f"[0:v]{pts_str}[v];[0:a]{atempo_str}[a]"
-        cmd.extend(["-filter_complex", filter_complex, "-map", "[v]", "-map", "[a]", tmp_out])
+    tmp_out = make_temp_output(output_file, input_file)
+    speed = duration / target_seconds
+    has_audio = has_audio_stream(input_file)
+    if fast and is_near_integer_speed(speed):
+        cmd = build_itsscale_cmd(input_file, speed, has_audio, tmp_out)
     else:
-        filter_complex = f"[0:v]{pts_str}[v]"
-        cmd.extend(["-filter_complex", filter_complex, "-map", "[v]", "-an", tmp_out])
+        cmd = build_shorten_cmd(["-i", input_file], duration, target_seconds, has_audio, tmp_out, hwaccel)
     print(f"執行 FFmpeg: {' '.join(cmd)}")
-    # 不把 stdout 全部吃掉，這樣 ffmpeg 出錯時可以看見原因
-    subprocess.run(cmd, check=True)
+    try:
+        # 不把 stdout 全部吃掉，這樣 ffmpeg 出錯時可以看見原因
+        subprocess.run(cmd, check=True)
+    except BaseException:
+        if os.path.exists(tmp_out): os.remove(tmp_out)
+        raise
    
-    # 用縮短後的暫存檔替換 input_file（覆蓋）
-    shutil.move(tmp_out, input_file)
+    # 用縮短後的暫存檔替換 output_file（覆蓋）
+    os.replace(tmp_out, output_file)
    
-    new_duration = get_duration(input_file)
-    print(f"縮短完成，新長度為 {new_duration:.2f}s")
+    # 新長度就是 duration / speed = target_seconds，不必再跑一次 ffprobe
+    print(f"縮短完成，新長度約為 {target_seconds:.2f}s")
 
-def parse_time_str(ts):
-    """將 'mm:ss.ms' 或 'ss.ms' 轉成秒數"""
-    if ':' in ts:
-        m, s = ts.split(':', 1)
-        return int(m) * 60 + float(s)
+def merge_and_shorten(files, output_file, target_seconds, durations=None, hwaccel="none"):
+    """合併 files 並縮短至目標秒數。
+    concat demuxer 直接當作縮短的輸入，同一個 ffmpeg 完成合併與縮短，不寫中介 mp4。
+    """
+    if durations is None:
+        durations = map_parallel(get_duration, files)
+    duration = sum(durations)
+    concat_list = build_concat_list(files)
+    # output_file 可能就是其中一個輸入檔，先寫到暫存檔，完成後再取代
+    tmp_out = make_temp_output(output_file, files[0])
+    if duration <= target_seconds:
+        print(f"總長度 {duration:.2f}s <= {target_seconds}s，不需要縮短，直接合併")
+        cmd = FFMPEG_BASE + ["-y"] + COPY_PROBE_OPTS + CONCAT_STDIN_INPUT + ["-c", "copy", tmp_out]
     else:
-        return float(ts)
+        print(f"總長度 {duration:.2f}s > {target_seconds}s，合併並縮短 (目標 {target_seconds}s)")
+        # 任一段有音軌就要處理聲音，不能只看第一段 (has_audio_stream 經 probe 快取，不必再跑 ffprobe)
+        has_audio = any(has_audio_stream(f) for f in files)
+        cmd = build_shorten_cmd(CONCAT_STDIN_INPUT, duration, target_seconds, has_audio, tmp_out, hwaccel)
+        print(f"執行 FFmpeg: {' '.join(cmd)}")
+    try:
+        subprocess.run(cmd, input=concat_list, check=True)
+    except BaseException:
+        if os.path.exists(tmp_out): os.remove(tmp_out)
+        raise
+    os.replace(tmp_out, output_file)
+
+def parse_time_str(ts):
+    """將 'mm:ss.ms' 或 'ss.ms' 轉成秒數；格式不符時拋出 ValueError"""
+    m = _TIME_RE.match(ts.strip())
+    if not m:
+        raise ValueError(f"時間格式錯誤: {ts}")
+    minutes, seconds = m.groups()
+    return int(minutes or 0) * 60 + float(seconds)
+
+# 找切點附近的關鍵影格時，ffprobe 只讀 [start - 此秒數, end + 此秒數] 之間的封包
+KEYFRAME_SEARCH_MARGIN = 10
+KEYFRAME_CACHE_SEGMENTS = 8  # 每個檔案在 probe 快取中最多保留幾段讀過的關鍵影格區段
+
+def keyframe_window(start, end):
+    """keyframe_times 實際讀取的區段 (秒)。"""
+    return max(0.0, start - KEYFRAME_SEARCH_MARGIN), end + KEYFRAME_SEARCH_MARGIN
+
+def keyframe_times(input_file, start, end, input_opts=None, input=None):
+    """
+    用一次 ffprobe 讀取影像串流的封包 (不解碼)，回傳 start~end 附近關鍵影格的時間 (秒，已排序)。
+    -read_intervals 讓 ffprobe 直接 seek 到區間開頭、讀到區間結尾就停，長影片也不必讀完整個檔案。
+    """
+    interval = "%".join(map(str, keyframe_window(start, end)))
+    cmd = [FFPROBE, "-v", "error"] + (input_opts or []) + [
+        "-select_streams", "v:0",
+        "-read_intervals", interval,
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0", input_file
+    ]
+    # 沒有 concat 清單要餵時，stdin 直接接 /dev/null，不繼承終端機
+    stdin = subprocess.DEVNULL if input is None else None
+    result = subprocess.run(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, input=input)
+    times = []
+    # 輸出可能有數萬行，直接在 bytes 上切割 (float 也接受 bytes)，不必先解碼整份輸出
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(b",")
+        if b"K" in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                continue
+    return sorted(times)
 
-def slice_video(input_file, slice_range, output_file):
-    """裁剪影片區間並輸出到指定的 output_file。"""
+def file_keyframe_times(file_path, start, end):
+    """
+    單一檔案 start~end 附近的關鍵影格時間。讀過的區段存進 probe 快取 (key 同樣是 path:size:mtime_ns)，
+    之後切同一個檔案時，區間落在讀過的區段內就不必再跑 ffprobe；每個檔案最多保留 KEYFRAME_CACHE_SEGMENTS 段。
+    """
+    global _probe_cache_dirty
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return []
+    key = f"{os.path.abspath(file_path)}:{st.st_size}:{st.st_mtime_ns}"
+    lo, hi = keyframe_window(start, end)
+    cache = load_probe_cache()
+    for seg_lo, seg_hi, times in cache.get(key, {}).get("keyframe_segments", []):
+        if seg_lo <= lo and hi <= seg_hi:
+            return times
+    times = keyframe_times(file_path, start, end)
+    if times:
+        with _probe_cache_lock:
+            entry = cache.setdefault(key, {})
+            segments = entry.get("keyframe_segments", []) + [[lo, hi, times]]
+            entry["keyframe_segments"] = segments[-KEYFRAME_CACHE_SEGMENTS:]
+            _probe_cache_dirty = True
+    return times
+
+def snap_to_keyframes(start, end, keyframes):
+    """把 start 往前對齊到 <= start 的關鍵影格、end 往後對齊到 >= end 的關鍵影格。"""
+    i = bisect.bisect_right(keyframes, start) - 1
+    kf_start = keyframes[i] if i >= 0 else 0.0
+    j = bisect.bisect_left(keyframes, end)
+    kf_end = keyframes[j] if j < len(keyframes) else end
+    return kf_start, kf_end
+
+def slice_video(input_file, slice_range, output_file, input_opts=None, input=None, exact=False, overwrite=False):
+    """裁剪影片區間並輸出到指定的 output_file。
+    input_opts 會放在 -i 之前 (例如 concat 清單需要 -f concat -safe 0)；
+    input 不為 None 時會寫入 ffmpeg 的 stdin (input_file 為 pipe:0 的 concat 清單)。
+    預設把區間對齊到關鍵影格 (單一檔案的關鍵影格經 probe 快取)，並把 -ss 放在 -i 之前直接跳轉，
+    stream copy 不必從頭讀取，切點也不會落在 GOP 中間造成黑畫面或音畫不同步。
+    stream copy 從 GOP 中間切入時時間戳可能為負，-avoid_negative_ts make_zero 讓輸出從 0 開始。
+    exact=True 時改為重新編碼 (libx264 veryfast)，切點精確到影格，但速度慢很多。
+    overwrite=False 時 output_file 已存在就不覆蓋 (ffmpeg -n)。
+    """
     if '-' not in slice_range:
         print("錯誤: --slice 格式錯誤，必須為 start-end (例如: 1:30-2:00.5)")
         sys.exit(1)
@@ -218,12 +756,26 @@ def slice_video(input_file, slice_range, output_file):
         sys.exit(1)
     duration = end - start
    
-    cmd = [
-        "ffmpeg", "-i", input_file, "-ss", str(start), "-to", str(end),
-        "-c", "copy", output_file
-    ]
+    if exact:
+        cmd = FFMPEG_BASE + overwrite_opts(overwrite) + (input_opts or []) + [
+            "-ss", str(start), "-t", str(duration), "-i", input_file,
+            "-c:v", "libx264", "-preset", "veryfast", "-threads", "0", "-c:a", "aac", output_file
+        ]
+    else:
+        if input is None and not input_opts:
+            keyframes = file_keyframe_times(input_file, start, end)
+        else:
+            keyframes = keyframe_times(input_file, start, end, input_opts, input)
+        if keyframes:
+            start, end = snap_to_keyframes(start, end, keyframes)
+            duration = end - start
+            print(f"對齊關鍵影格後的區間：{start:.3f}s → {end:.3f}s")
+        cmd = FFMPEG_BASE + overwrite_opts(overwrite) + COPY_PROBE_OPTS + (input_opts or []) + [
+            "-ss", str(start), "-t", str(duration), "-i", input_file,
+            "-c", "copy", "-avoid_negative_ts", "make_zero", output_file
+        ]
     print(f"裁剪 {input_file} {start:.3f}s → {end:.3f}s (共 {duration:.3f}s) (輸出 {output_file})")
-    subprocess.run(cmd, check=True)
+    subprocess.run(cmd, input=input, check=True)
     print(f"完成切片輸出：{output_file}")
 
 # -------------------
@@ -240,7 +792,7 @@ def run_adb_command(args, capture_output=True, check=True):
     """Run an adb command and return the result."""
     try:
         result = subprocess.run(
-            ["adb"] + args,
+            [ADB] + args,
             capture_output=capture_output,
             text=True,
             check=check
@@ -251,9 +803,16 @@ def run_adb_command(args, capture_output=True, check=True):
             raise
         return e
 
+def check_ffmpeg():
+    """確認 ffmpeg 與 ffprobe 都已安裝，缺少時直接結束。"""
+    for name, path in (("ffmpeg", FFMPEG), ("ffprobe", FFPROBE)):
+        if not os.path.isabs(path):
+            print(f"錯誤: {name} 未安裝或不在 PATH 中")
+            sys.exit(1)
+
 def check_adb():
     """Check if adb is installed and a device is connected."""
-    if not shutil.which("adb"):
+    if not os.path.isabs(ADB):
         print("錯誤: adb 未安裝或不在 PATH 中")
         sys.exit(1)
     try:
@@ -262,29 +821,58 @@ def check_adb():
         print("錯誤: 沒有找到 adb 裝置，請確認已連線")
         sys.exit(1)
 
-def check_remote_dir():
-    """Check if the remote Camera directory exists."""
-    result = run_adb_command(["shell", f"[ -d '{REMOTE_DIR}' ] && echo exists"], check=False)
-    if result.returncode != 0 or "exists" not in result.stdout:
-        print(f"錯誤: 遠端目錄 {REMOTE_DIR} 不存在")
-        sys.exit(1)
+def iter_adb_shell_lines(command):
+    """
+    以一次 `adb shell command` 執行指令，邊從 adb 讀取邊逐行產生輸出 (不含換行)，不必等整份輸出到齊。
+    指令結束碼不為 0 時，在輸出讀完後拋出 CalledProcessError。
+    """
+    # surrogateescape：檔名不是 UTF-8 時也不會中途 UnicodeDecodeError，傳回 adb pull 時會還原成原本的 bytes
+    with subprocess.Popen([ADB, "shell", command], stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, text=True, errors="surrogateescape") as proc:
+        for line in proc.stdout:
+            yield line.rstrip("\n")
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, [ADB, "shell", command])
+
+def walk_local_files(directory):
+    """以 os.scandir 疊代走訪 directory，逐一產生檔案的相對路徑 (str)。
+    entry.is_file(follow_symlinks=False) 直接使用 readdir 的 d_type，不需額外 stat。
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield os.path.relpath(entry.path, directory)
+        except OSError:
+            continue
 
-def get_file_list(directory, is_remote=False):
-    """Get sorted list of relative file paths from a directory."""
-    if is_remote:
-        # 排除 .trashed* 檔案
-        cmd = ["shell", f"cd '{directory}' && find . -type f -not -name '.trashed*' -printf '%P\\n'"]
-        result = run_adb_command(cmd)
-        files = result.stdout.strip().splitlines()
-    else:
-        files = []
-        for path in Path(directory).rglob("*"):
-            if path.is_file():
-                files.append(str(path.relative_to(directory)))
-    return sorted(files)
-
-def sync_files():
-    """2025 終極同步函數：支援所有 Android 版本與 Scoped Storage"""
+def sorted_difference(left, right):
+    """
+    兩個已排序序列的差集 (在 left 但不在 right)，依序產生結果。
+    雙指標同步往前走，O(N) 時間、只需保存結果本身，不必另外建立兩個 set。
+    """
+    end = object()
+    right_iter = iter(right)
+    current = next(right_iter, end)
+    for item in left:
+        while current is not end and current < item:
+            current = next(right_iter, end)
+        if current is end or item != current:
+            yield item
+
+def pull_batch(sources, dst_dir):
+    """一次 adb pull 多個遠端檔案到 dst_dir (-a 保留時間戳)，共用同一個傳輸通道。"""
+    run_adb_command(["pull", "-a"] + sources + [dst_dir])
+
+def sync_files(workers=None):
+    """2025 終極同步函數：支援所有 Android 版本與 Scoped Storage
+    workers: 同時進行的 adb pull 數量，預設 PULL_WORKERS (USB3 / Wi-Fi adb 可調高)。
+    """
     check_adb()
 
     # === Fallback：暴力搜尋所有可能路徑 ===
@@ -292,19 +880,21 @@ def sync_files():
         REMOTE_DIR,
     ]
 
-    remote_files = set()
+    # 相對路徑 -> 手機上的完整路徑 (直接取自 find 的輸出，不需再逐一 test -f 確認)
+    remote_paths = {}
+    remote_stats = {}  # 相對路徑 -> 手機上的 (檔案大小 bytes, mtime 秒)，與路徑在同一次 find 取得
     for base in possible_bases:
         base_q = adb_quote(base)
-        cmd = [
-            "shell",
+        cmd = (
             f"find {base_q} -type f \\( "
             "-iname '*.mp4' -o -iname '*.jpg' -o -iname '*.jpeg' -o -iname '*.heic' "
-            "\\) 2>/dev/null"
-        ]
+            "\\) -printf '%s\\t%T@\\t%p\\n' 2>/dev/null"
+        )
         try:
-            out = run_adb_command(cmd, check=False, capture_output=True)
-            for line in out.stdout.splitlines():
-                line = line.strip()
+            # 邊接收 find 的輸出邊處理，不必先把整份清單讀進一個大字串
+            for line in iter_adb_shell_lines(cmd):
+                size, _, line = line.strip().partition("\t")
+                mtime, _, line = line.partition("\t")
                 if not line:
                     continue
                 # 轉成相對路徑（只保留 Camera 之後的部分）
@@ -312,135 +902,211 @@ def sync_files():
                     if prefix in line:
                         rel_path = line.split(prefix, 1)[1]
                         if rel_path and not os.path.basename(rel_path).startswith("."):
-                            remote_files.add(rel_path)
+                            if rel_path not in remote_paths:
+                                remote_paths[rel_path] = line
+                                remote_stats[rel_path] = (int(size) if size.isdigit() else None,
+                                                          _to_float(mtime))
                         break
-        except:
-            continue
+        except (subprocess.CalledProcessError, OSError) as e:
+            # 清單不完整時後面的比對與下載都不可靠，直接中止同步
+            print(f"錯誤: 無法取得手機上 {base} 的檔案清單: {e}")
+            sys.exit(1)
 
-    if not remote_files:
+    if not remote_paths:
         print("警告：手機上完全找不到相機檔案（可能權限問題或資料夾被隱藏）")
         return
 
-    # === 本地檔案集合 ===
-    local_files = set()
-    for p in Path(LOCAL_DIR).rglob("*"):
-        if p.is_file():
-            rel = str(p.relative_to(LOCAL_DIR))
-            if not os.path.basename(rel).startswith("."):
-                local_files.add(rel)
+    # === 本地檔案清單 (已排序) ===
+    local_files = sorted(
+        rel for rel in walk_local_files(LOCAL_DIR)
+        if not os.path.basename(rel).startswith(".")
+    )
 
-    # === 計算需要下載的檔案 ===
-    to_download = sorted(remote_files - local_files)
+    # === 計算需要下載的檔案：兩份已排序清單線性比對 ===
+    to_download = list(sorted_difference(sorted(remote_paths), local_files))
+    # 兩邊都有但大小不同時：本地比較小且 mtime 不是手機上的時間 (pull -a 會保留時間戳)，
+    # 看起來是上次 pull 中斷留下的不完整檔案，才重新下載；其他情況可能是本地編輯過，只警告不覆蓋
+    incomplete, differ = [], []
+    for rel in local_files:
+        remote_size, remote_mtime = remote_stats.get(rel, (None, None))
+        if remote_size is None:
+            continue
+        try:
+            st = os.stat(os.path.join(LOCAL_DIR, rel))
+        except OSError:
+            continue
+        if st.st_size == remote_size:
+            continue
+        if st.st_size < remote_size and (remote_mtime is None or int(st.st_mtime) != int(remote_mtime)):
+            incomplete.append(rel)
+        else:
+            differ.append(rel)
+    if differ:
+        print(f"⚠️ {len(differ)} 個檔案與手機上的大小不同 (可能已在本地編輯)，略過不覆蓋:")
+        for rel in differ:
+            print(f"  {rel}")
+    if incomplete:
+        print(f"{len(incomplete)} 個檔案比手機上的小 (可能是中斷的下載)，將重新下載")
+        to_download = sorted(to_download + incomplete)
 
     if not to_download:
         print("已是最新狀態，沒有新檔案")
         return
 
-    print(f"發現 {len(to_download)} 個新檔案，開始下載...")
-    success = 0
+    # 依子目錄分組，每組切成最多 PULL_BATCH_SIZE 個檔案的批次，一個批次只需一次 adb pull
+    groups = {}
     for rel in to_download:
-        # 嘗試從所有可能路徑找到來源
-        src_path = None
-        for base in possible_bases:
-            for prefix in ["", "/DCIM/Camera", "/100ANDRO/Camera", "/Camera"]:
-                candidate = f"{base}{prefix}/{rel}"
-                candidate_q = adb_quote(candidate)
-
-                if run_adb_command(
-                    ["shell", f"test -f {candidate_q}"],
-                    check=False
-                ).returncode == 0:
-                    src_path = candidate
-                    break
-            if src_path:
-                break
-
-        if not src_path:
-            print(f"警告：找不到來源路徑，跳過 {rel}")
-            continue
-
-        dst_path = os.path.join(LOCAL_DIR, rel)
-        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-        
-        # 使用 \r 並加上 end=""，讓游標停在行首不換行
-        print(f"\r正在下載 {rel} ...", end="", flush=True)
-        
+        groups.setdefault(os.path.dirname(rel), []).append(rel)
+    batches = []
+    for sub_dir, rels in groups.items():
+        # 先在主執行緒建立好所有目的目錄，平行下載時就不會搶著 makedirs
+        os.makedirs(os.path.join(LOCAL_DIR, sub_dir), exist_ok=True)
+        for i in range(0, len(rels), PULL_BATCH_SIZE):
+            batches.append((sub_dir, rels[i:i + PULL_BATCH_SIZE]))
+
+    def pull_one_batch(batch):
+        sub_dir, rels = batch
         try:
-            run_adb_command(["pull", src_path, dst_path])
-            # 下載成功後，直接印出完成訊息（會覆蓋掉原本的正在下載訊息）
-            # 加上 \033[K 是 ANSI 跳脫字元，用來清除該行剩餘的文字，避免長檔名被短檔名覆蓋時留下殘影
-            print(f"\r✅ 完成 {rel}\033[K") 
-            success += 1
-        except:
-            print(f"\r❌ 失敗 {rel}\033[K")
+            pull_batch([remote_paths[rel] for rel in rels], os.path.join(LOCAL_DIR, sub_dir))
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    print(f"共 {len(to_download)} 個檔案需要下載，分成 {len(batches)} 批開始下載...")
+    success = 0
+    with ThreadPoolExecutor(max_workers=min(workers or PULL_WORKERS, len(batches))) as executor:
+        for (sub_dir, rels), ok in zip(batches, executor.map(pull_one_batch, batches)):
+            label = f"{sub_dir or '.'} ({len(rels)} 個檔案: {rels[0]} ... {rels[-1]})" if len(rels) > 1 else rels[0]
+            if ok:
+                print(f"✅ 完成 {label}")
+                success += len(rels)
+            else:
+                print(f"❌ 失敗 {label}")
 
     print(f"\n同步完成！成功下載 {success}/{len(to_download)} 個檔案")
 
 def get_video_info(file_path):
     """🔹 取得影片的長度與解析度資訊
     回傳 (duration: float, width: int|None, height: int|None)
-    此函式會盡量將 width/height 轉為 int；若解析度無法取得則回傳 None。
+    若解析度無法取得則回傳 None。
     """
-    cmd = [
-        "ffprobe", "-v", "error",
-        "-select_streams", "v:0",
-        "-show_entries", "stream=width,height",
-        "-show_entries", "format=duration",
-        "-of", "default=noprint_wrappers=1:nokey=1",
-        file_path
-    ]
-    # 執行 ffprobe
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    lines = result.stdout.strip().splitlines()
-
-    duration = 0.0
-    width = None
-    height = None
+    info = probe(file_path)
+    return info["duration"], info["width"], info["height"]
+
+@functools.lru_cache(maxsize=1)
+def available_encoders():
+    """執行一次 `ffmpeg -encoders` 並快取此 ffmpeg 編譯時支援的編碼器名稱。"""
+    result = subprocess.run([FFMPEG, "-hide_banner", "-encoders"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    names = set()
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # 編碼器列的格式: " V....D h264_nvenc  NVIDIA NVENC H.264 encoder"
+        if len(fields) >= 2 and len(fields[0]) == 6 and fields[0][0] in "VAS":
+            names.add(fields[1])
+    return frozenset(names)
+
+@functools.lru_cache(maxsize=1)
+def available_filters():
+    """執行一次 `ffmpeg -filters` 並快取此 ffmpeg 編譯時支援的濾鏡名稱。"""
+    result = subprocess.run([FFMPEG, "-hide_banner", "-filters"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    names = set()
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # 濾鏡列的格式: " ... rubberband        A->A       Apply time-stretching and pitch-shifting."
+        if len(fields) >= 3 and len(fields[0]) == 3 and "->" in fields[2]:
+            names.add(fields[1])
+    return frozenset(names)
+
+@functools.lru_cache(maxsize=None)
+def hwaccel_works(hwaccel, sample=None, resolution=None):
+    """
+    實際用 hwaccel 試跑一張影格：ffmpeg 有編入編碼器不代表這台機器有對應的 GPU/驅動。
+    沒有 sample 時以 nullsrc 測試 encoder_args 的編碼 (vaapi 需要 -vaapi_device 與 hwupload)；
+    有 sample 時對該檔案試跑 --shrink 的 scale_args 整條流程 (硬體解碼 → 硬體縮放 → 編碼)。
+    """
+    if sample is None:
+        input_opts, vf_suffix, codec = encoder_args(hwaccel)
+        inputs = ["-f", "lavfi", "-i", "nullsrc=s=256x256"]
+        vf = f"format=yuv420p{vf_suffix}"
+    else:
+        input_opts, vf, codec = scale_args(hwaccel, resolution)
+        # 沒有編入對應的縮放濾鏡 (scale_cuda/scale_qsv/scale_vaapi) 就不必試跑
+        if vf.split("=", 1)[0] not in available_filters():
+            return False
+        inputs = ["-i", sample]
+    cmd = FFMPEG_BASE + input_opts + inputs + [
+        "-frames:v", "1", "-vf", vf,
+    ] + codec + ["-an", "-f", "null", "-"]
+    return subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+def resolve_hwaccel(hwaccel, sample=None, resolution=None):
+    """
+    把 --hwaccel auto 換成實際可用的硬體編碼 (nvenc > qsv > vaapi > videotoolbox)，都沒有則為 none。
+    有編入的編碼器會先試跑一張影格 (hwaccel_works)，失敗就換下一個；
+    --shrink 會傳入第一個要縮小的檔案與解析度，試跑的是與 shrink_video 相同的解碼/縮放/編碼。
+    """
+    if hwaccel != "auto":
+        return hwaccel
+    encoders = available_encoders()
+    for name in ("nvenc", "qsv", "vaapi", "videotoolbox"):
+        if f"h264_{name}" in encoders and hwaccel_works(name, sample, resolution):
+            return name
+    return "none"
+
+def encoder_args(hwaccel):
+    """
+    軟體濾鏡 (例如字幕燒錄) 之後接硬體編碼器時使用。
+    回傳 (-i 之前的參數, 要接在 -vf 後面的濾鏡, 影像編碼參數)。
+    """
+    if hwaccel == "nvenc":
+        return [], "", ["-c:v", "h264_nvenc", "-preset", "p4"]
+    if hwaccel == "qsv":
+        return [], "", ["-c:v", "h264_qsv"]
+    if hwaccel == "vaapi":
+        return ["-vaapi_device", VAAPI_DEVICE], ",format=nv12,hwupload", ["-c:v", "h264_vaapi"]
+    if hwaccel == "videotoolbox":
+        return [], "", ["-c:v", "h264_videotoolbox"]
+    # CPU: 讓 libx264 使用所有核心
+    return [], "", ["-threads", "0"]
+
+def scale_args(hwaccel, resolution):
+    """
+    縮放整段都在 GPU 上完成 (解碼 → 縮放 → 編碼)。
+    回傳 (-i 之前的參數, -vf 濾鏡, 影像編碼參數)。
+    """
+    width, height = resolution.split("x")
+    if hwaccel == "nvenc":
+        return (["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+                f"scale_cuda={width}:{height}", ["-c:v", "h264_nvenc", "-preset", "p4"])
+    if hwaccel == "qsv":
+        return (["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"],
+                f"scale_qsv=w={width}:h={height}", ["-c:v", "h264_qsv"])
+    if hwaccel == "vaapi":
+        return (["-hwaccel", "vaapi", "-hwaccel_device", VAAPI_DEVICE, "-hwaccel_output_format", "vaapi"],
+                f"scale_vaapi=w={width}:h={height}", ["-c:v", "h264_vaapi"])
+    if hwaccel == "videotoolbox":
+        # macOS：縮放仍用 CPU 的 scale，但編碼交給 VideoToolbox
+        return ["-hwaccel", "videotoolbox"], f"scale={resolution}", ["-c:v", "h264_videotoolbox"]
+    return [], f"scale={resolution}", ["-threads", "0"]
+
+def shrink_output_name(file_path, resolution):
+    """--shrink 的輸出檔名：input-WxH.ext"""
+    base, ext = os.path.splitext(file_path)
+    return f"{base}-{resolution}{ext}"
 
-    # ffprobe 典型輸出： width\nheight\nduration\n
-    try:
-        if len(lines) >= 3:
-            # 安全轉型
-            try:
-                width = int(lines[0])
-            except (ValueError, TypeError):
-                width = None
-            try:
-                height = int(lines[1])
-            except (ValueError, TypeError):
-                height = None
-            try:
-                duration = float(lines[2])
-            except (ValueError, TypeError):
-                duration = 0.0
-        elif len(lines) == 1:
-            # 只有 duration
-            try:
-                duration = float(lines[0])
-            except (ValueError, TypeError):
-                duration = 0.0
-    except Exception:
-        # 防止意外的解析錯誤
-        duration = 0.0
-        width = None
-        height = None
-
-    return duration, width, height
-
-def shrink_video(resolution, file_path):
-    # 驗證解析度格式，例如 "1024x768"
-    if not re.match(r'^\d+x\d+$', resolution):
-        print("錯誤: 解析度格式必須為 WxH，例如 640x480")
-        sys.exit(1)
+def shrink_video(resolution, file_path, hwaccel="none", overwrite=False):
     # 檢查檔案是否存在
     if not os.path.exists(file_path):
         print(f"錯誤: 找不到檔案 {file_path}")
         sys.exit(1)
-    base, ext = os.path.splitext(file_path)
-    output_file = f"{base}-{resolution}{ext}"
-    cmd = [
-        "ffmpeg", "-i", file_path,
-        "-vf", f"scale={resolution}",
+    output_file = shrink_output_name(file_path, resolution)
+    input_opts, vf, codec = scale_args(hwaccel, resolution)
+    cmd = FFMPEG_BASE + overwrite_opts(overwrite) + input_opts + [
+        "-i", file_path,
+        "-vf", vf,
+    ] + codec + [
         "-c:a", "copy",
         output_file
     ]
@@ -471,7 +1137,7 @@ def parse_pos(pos_str, width, height):
     print(f"錯誤: 無效的位置格式 '{pos_str}'")
     sys.exit(1)
 
-def add_subtitle(input_file, subtitle_file, output_file, font, pos, size):
+def add_subtitle(input_file, subtitle_file, output_file, font, pos, size, hwaccel="none", overwrite=False):
     """將 SRT 字幕檔加到影片中，並輸出到指定的 output_file。"""
     # 檢查字幕檔是否存在
     if not os.path.exists(subtitle_file):
@@ -490,9 +1156,12 @@ def add_subtitle(input_file, subtitle_file, output_file, font, pos, size):
     styles["Fontsize"] = str(size)
     styles["Fontname"] = font
     force_style_str = ','.join(f"{k}={v}" for k,v in styles.items())
-    cmd = [
-        "ffmpeg", "-i", input_file,
-        "-vf", f"subtitles={shlex.quote(subtitle_file)}:force_style='{force_style_str}'",
+    # 字幕燒錄只能在 CPU 上做，硬體加速只用在之後的編碼
+    input_opts, vf_suffix, codec = encoder_args(hwaccel)
+    cmd = FFMPEG_BASE + overwrite_opts(overwrite) + input_opts + [
+        "-i", input_file,
+        "-vf", f"subtitles={shlex.quote(subtitle_file)}:force_style='{force_style_str}'{vf_suffix}",
+    ] + codec + [
         "-c:a", "copy",
         output_file
     ]
@@ -507,8 +1176,8 @@ def mute_video(input_file, output_file=None):
         output_file = f"{base}_mute{ext}"
 
     print(f"靜音處理：{os.path.basename(input_file)} → {os.path.basename(output_file)}")
-    cmd = [
-        "ffmpeg", "-y",
+    cmd = FFMPEG_BASE + [
+        "-y",
         "-i", input_file,
         "-c", "copy",       # 影片流直接 copy，不重新編碼
         "-an",              # 移除所有音訊
@@ -553,7 +1222,7 @@ def validate_date_format_opt(date_str):
     if date_str is None or date_str == LATEST_DATE_CONST:
         return date_str
         
-    if not re.match(r'^\d{8}$', date_str):
+    if not _YMD_RE.match(date_str):
         # 這裡需要一個 ArgumentTypeError 來讓 argparse 捕捉錯誤
         raise argparse.ArgumentTypeError(f"日期格式錯誤: '{date_str}'，必須是 YYYYmmdd 格式。")
     try:
@@ -562,6 +1231,29 @@ def validate_date_format_opt(date_str):
     except ValueError:
         raise argparse.ArgumentTypeError(f"日期無效: '{date_str}'，請檢查月份和日期是否合法。")
 
+def exit_if_outputs_exist(output_files, overwrite=False):
+    """
+    輸出檔已存在時先列出並結束，不啟動任何 ffmpeg；overwrite=True (--overwrite) 時不檢查。
+    合併/切片/縮小/加字幕預設不覆蓋既有檔案 (ffmpeg -n)，-nostdin 下 ffmpeg 也不能再詢問。
+    """
+    if overwrite:
+        return
+    existing = [f for f in output_files if os.path.exists(f)]
+    for f in existing:
+        print(f"錯誤: 輸出檔已存在 {f}，請先刪除、用 -n 指定其他檔名，或加上 --overwrite")
+    if existing:
+        sys.exit(1)
+
+def positive_int(value):
+    """argparse 用的型別：必須是 >= 1 的整數。"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"必須是整數: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必須 >= 1: '{value}'")
+    return number
+
 def main():
     examples = f"""
     功能分類:
@@ -575,6 +1267,9 @@ def main():
       -m, --merge              合併影片
       -s, --shorten SECONDS    縮短影片長度至指定秒數
       -S, --slice START-END    影片切片 (mm:ss.ms-mm:ss.ms)
+          --exact              切片時重新編碼，切點精確到影格 (較慢)；
+                               預設對齊關鍵影格並 stream copy (區間可能稍微變長)
+          --fast-shorten       整數倍速縮短時影像不重新編碼 (-itsscale，輸出影格率會變成原本的倍數)
       -f, --files "PATTERNS"   指定檔案或萬用字元
       -n, --name OUTPUT.mp4    指定輸出檔名
     【影片處理】
@@ -584,10 +1279,17 @@ def main():
           --font PATH          字型檔 (預設 NotoSansCJK)
           --pos POS            top-left / bottom-center / center ...
           --size N             字幕大小
+          --hwaccel MODE       縮小/加字幕/縮短時的硬體編碼 (auto|nvenc|qsv|vaapi|videotoolbox|none，預設 none)
+      -j, --jobs N             同時處理的數量：縮小/加字幕/縮短/切片 (預設 CPU 核心數/4，
+                               使用 --hwaccel 時預設 {GPU_JOBS})；
+                               --sync 時為同時 adb pull 的批次數 (預設 4)
       -u, --mute               移除影片音軌
     【手機同步】
       -y, --sync               從 Android DCIM/Camera 同步到本機
       -p, --push               將本機檔案推送到手機 Camera
+    【其他】
+          --overwrite          合併/切片/縮小/加字幕時覆蓋已存在的輸出檔 (預設不覆蓋)
+          --clear-cache        清除 ffprobe 結果快取 (~/.cache/camtools/probe.json)
     依賴:
       ffmpeg / ffprobe / adb
     """
@@ -613,6 +1315,10 @@ def main():
     parser.add_argument("-m", "--merge", action="store_true", help=argparse.SUPPRESS)
     parser.add_argument("-s", "--shorten", type=float, help=argparse.SUPPRESS)
     parser.add_argument("-S", "--slice", help=argparse.SUPPRESS)
+    # 對齊關鍵影格已是預設行為，--fast-slice 只為了相容舊的指令而保留
+    parser.add_argument("--fast-slice", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--exact", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--fast-shorten", action="store_true", help=argparse.SUPPRESS)
     parser.add_argument("-n", "--name", help=argparse.SUPPRESS)
     parser.add_argument("--shrink", type=str, metavar="RESOLUTION", help=argparse.SUPPRESS)
     parser.add_argument("--text", action="store_true", help=argparse.SUPPRESS)
@@ -620,17 +1326,30 @@ def main():
     parser.add_argument("--font", type=str, default=DEFAULT_FONT_PATH, help=argparse.SUPPRESS)
     parser.add_argument("--pos", type=str, default="top-left", help=argparse.SUPPRESS)
     parser.add_argument("--size", type=int, default=16, help=argparse.SUPPRESS)
+    parser.add_argument("--hwaccel", choices=["auto", "nvenc", "qsv", "vaapi", "videotoolbox", "none"], default="none", help=argparse.SUPPRESS)
+    parser.add_argument("-j", "--jobs", type=positive_int, default=None, help=argparse.SUPPRESS)
     parser.add_argument("-y", "--sync", action="store_true", help=argparse.SUPPRESS)
     parser.add_argument("-p", "--push", action="store_true", help=argparse.SUPPRESS)
     parser.add_argument( "-u", "--mute", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--overwrite", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--clear-cache", action="store_true", help=argparse.SUPPRESS)
 
     args = parser.parse_args()
+    if args.exact and args.fast_slice:
+        parser.error("--exact 不能與 --fast-slice 同時使用")
     # --- 判斷是否有任何參數被使用 ---
-    is_any_arg_used = any(arg is not None and arg is not False for arg in vars(args).values() if arg != LATEST_DATE_CONST) or args.last
+    # 只看模式旗標；--font/--pos/--size 等有預設值的參數不算，否則單獨給它們時會什麼都不做
+    is_any_arg_used = any(getattr(args, name) not in (None, False) for name in MODE_FLAGS)
 
     if not is_any_arg_used:
         parser.print_help()
         sys.exit(0)
+    # --- 0. 清除 ffprobe 快取 (--clear-cache) ---
+    if args.clear_cache:
+        clear_probe_cache()
+        print(f"✅ 已清除 ffprobe 快取：{PROBE_CACHE_FILE}")
+        return
+
     # --- 1. 同步模式 (--sync) ---
     if args.sync:
         # 檢查其他衝突選項 (排除 args.last 可能是 LATEST_DATE_CONST)
@@ -638,7 +1357,7 @@ def main():
         if any(conflict_args) or (args.last is not None):
             print("錯誤: --sync 不能與其他處理選項同時使用")
             sys.exit(1)
-        sync_files()
+        sync_files(args.jobs)
         return
 
     # --- 1.5. 推送模式 (--push) ---
@@ -663,6 +1382,10 @@ def main():
         push_files(files_to_push)
         return
 
+    # 之後的模式除了 --date 都會呼叫 ffmpeg/ffprobe，先確認有安裝
+    if not args.date:
+        check_ffmpeg()
+
     # --- 2. 統計模式 (--last, --date, --info) ---
     if args.last is not None or args.date:
         conflict_args = [args.info, args.merge, args.files, args.shorten, args.slice, args.shrink, args.name, args.text, args.subtitle, args.sync, args.mute]
@@ -678,7 +1401,7 @@ def main():
             show_date(None)
             return
         # --last 模式 (現在處理日期)
-        files = find_files(["mp4", "heic", "HEIC", "jpg", "JPG", "jpeg"])
+        files = find_files(["mp4", "heic", "jpg", "jpeg"])
        
         target_date = None
         if args.last != LATEST_DATE_CONST:
@@ -701,8 +1424,7 @@ def main():
         infos = []
         total_duration = 0.0
 
-        for f in files:
-            duration, w, h = get_video_info(f)
+        for f, (duration, w, h) in zip(files, map_parallel(get_video_info, files)):
             total_duration += duration
             # w, h 已保證為 int 或 None
             infos.append({
@@ -760,83 +1482,63 @@ def main():
         is_chain_process = args.merge and (args.shorten or args.slice) # 合併後接縮短/切片
        
         if is_chain_process:
-            # 模式 1: 合併 -> (縮短 或 切片)
-            temp_merged_file = os.path.join("/tmp", f"temp_merge_chain.{os.getpid()}.mp4")
-            concat_file = build_concat_file(files_to_process)
-           
-            print(f"步驟 1/2: 暫時合併 {len(files_to_process)} 個檔案到 {temp_merged_file}...")
-            try:
-                subprocess.run(["ffmpeg", "-f", "concat", "-safe", "0", "-i", concat_file, "-c", "copy", temp_merged_file],
-                                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
-            except subprocess.CalledProcessError as e:
-                print(f"FFmpeg 暫時合併失敗: {e}")
-                if os.path.exists(concat_file): os.remove(concat_file)
-                if os.path.exists(temp_merged_file): os.remove(temp_merged_file)
-                sys.exit(1)
-            finally:
-                if os.path.exists(concat_file): os.remove(concat_file)
+            # 模式 1: 合併 -> (縮短 或 切片)，不再寫出中介的合併 mp4
             # 決定最終輸出檔名
             if manual_output_name:
                 output_file = manual_output_name
             else:
-                safe_file_tag = re.sub(r'[^\w\-]', '_', os.path.basename(args.files.split()[0].replace('*','').replace('?','')))
+                safe_file_tag = _UNSAFE_TAG_RE.sub('_', os.path.basename(args.files.split()[0].replace('*','').replace('?','')))
                 action = "shorten" if args.shorten else "slice"
-                output_file = f"{TODAY}-{safe_file_tag}-{action}.mp4"
-           
+                output_file = f"{today()}-{safe_file_tag}-{action}.mp4"
+
+            if args.slice:
+                exit_if_outputs_exist([output_file], args.overwrite)
+            input_durations = map_parallel(get_duration, files_to_process)
             try:
                 if args.shorten:
-                    # 在中介檔上先執行縮短，完成後再移動到最終檔名
-                    shorten_video(temp_merged_file, args.shorten)
-                    shutil.move(temp_merged_file, output_file)
+                    # concat 輸出經 pipe 直接進入縮短的 ffmpeg
+                    merge_and_shorten(files_to_process, output_file, args.shorten, durations=input_durations,
+                                      hwaccel=resolve_hwaccel(args.hwaccel))
                     print(f"✅ 成功建立檔案: {output_file}")
                 elif args.slice:
-                    # 切片會產生新檔：slice_video(輸入, 區間, 輸出)
-                    slice_video(temp_merged_file, args.slice, output_file)
+                    # concat 清單直接當作切片的輸入，由同一個 ffmpeg 完成合併與切片
+                    slice_video("pipe:0", args.slice, output_file, input_opts=CONCAT_STDIN_INPUT[:-2],
+                                input=build_concat_list(files_to_process), exact=args.exact,
+                                overwrite=args.overwrite)
                     print(f"✅ 成功建立檔案: {output_file}")
                 
                 # ===== 新增：印出合併的檔案清單與長度 =====
                 print("\n🔹 實際合併的檔案清單 (依序):")
-                total_input_duration = 0.0
-                for idx, f in enumerate(files_to_process, 1):
-                    dur = get_duration(f)
-                    total_input_duration += dur
+                for idx, (f, dur) in enumerate(zip(files_to_process, input_durations), 1):
                     print(f"  {idx}. {f} ({dur:.2f}s)")
                 
                 final_dur = get_duration(output_file)
                 print("-" * 40)
-                print(f"原始總長度: {total_input_duration:.2f}s")
+                print(f"原始總長度: {sum(input_durations):.2f}s")
                 print(f"處理後長度: {final_dur:.2f}s (輸出檔: {output_file})")
                 print("-" * 40)
                 # =========================================
 
             except subprocess.CalledProcessError as e:
                 print(f"FFmpeg 處理失敗: {e}")
-                if os.path.exists(temp_merged_file): os.remove(temp_merged_file)
                 sys.exit(1)
-            finally:
-                # 無論成功或失敗，都嘗試清除中介檔（如果還存在）
-                if os.path.exists(temp_merged_file):
-                    try:
-                        os.remove(temp_merged_file)
-                    except:
-                        pass
             return
         elif args.merge:
             # 模式 2: 純合併 (-m, -f)
-            output_file = manual_output_name if manual_output_name else f"{TODAY}-merge.mp4"
+            output_file = manual_output_name if manual_output_name else f"{today()}-merge.mp4"
            
-            concat_file = build_concat_file(files_to_process)
+            exit_if_outputs_exist([output_file], args.overwrite)
             print(f"合併影片輸出: {output_file}")
            
             try:
-                subprocess.run(["ffmpeg", "-f", "concat", "-safe", "0", "-i", concat_file, "-c", "copy", output_file], check=True)
+                subprocess.run(FFMPEG_BASE + overwrite_opts(args.overwrite) + COPY_PROBE_OPTS + CONCAT_STDIN_INPUT + ["-c", "copy", output_file],
+                               input=build_concat_list(files_to_process), check=True)
                 print(f"✅ 成功建立檔案：{output_file}")
                 
                 # ===== 新增：印出合併的檔案清單與長度 =====
                 print("\n🔹 實際合併的檔案清單 (依序):")
                 total_input_duration = 0.0
-                for idx, f in enumerate(files_to_process, 1):
-                    dur = get_duration(f)
+                for idx, (f, dur) in enumerate(zip(files_to_process, map_parallel(get_duration, files_to_process)), 1):
                     total_input_duration += dur
                     print(f"  {idx}. {f} ({dur:.2f}s)")
                 
@@ -850,9 +1552,6 @@ def main():
             except subprocess.CalledProcessError as e:
                 print(f"FFmpeg 合併失敗: {e}")
                 sys.exit(1)
-            finally:
-                if os.path.exists(concat_file):
-                    os.remove(concat_file)
             return
         elif args.shorten:
             # 模式 3: 純縮短 (對每個檔案獨立縮短, -s, -f)
@@ -862,28 +1561,19 @@ def main():
                 print("錯誤: 單獨縮短 (-s) 並指定輸出檔名 (-n) 時，一次只能處理一個檔案。")
                 sys.exit(1)
                 
+            hwaccel = resolve_hwaccel(args.hwaccel)
             print(f"準備對 {len(files_to_process)} 個檔案執行獨立縮短...")
-            for input_file in files_to_process:
+            def shorten_one(input_file):
                 # 如果指定了檔名，且只有一個檔案，則將結果移動為指定名稱
                 if manual_output_name:
-                    # 使用一個臨時檔名，然後移動到指定檔名
-                    base, ext = os.path.splitext(input_file)
-                    temp_output = f"{base}-temp{ext}"
-                    shutil.copy(input_file, temp_output) # 複製一份到臨時檔
-                    try:
-                        shorten_video(temp_output, args.shorten)
-                        shutil.move(temp_output, manual_output_name)
-                        print(f"✅ 成功建立檔案: {manual_output_name}")
-                    except subprocess.CalledProcessError as e:
-                        print(f"縮短失敗 {input_file}: {e}")
-                        if os.path.exists(temp_output): os.remove(temp_output)
+                    # 直接讀原檔、寫到指定檔名，不需要先複製一份原檔
+                    shorten_video(input_file, args.shorten, manual_output_name, hwaccel, args.fast_shorten)
+                    print(f"✅ 成功建立檔案: {manual_output_name}")
                 else:
                     # 覆蓋原檔案
-                    try:
-                        shorten_video(input_file, args.shorten)
-                        print(f"✅ 成功建立檔案: {input_file} (已覆蓋原檔)")
-                    except subprocess.CalledProcessError as e:
-                        print(f"縮短失敗 {input_file}: {e}")
+                    shorten_video(input_file, args.shorten, hwaccel=hwaccel, fast=args.fast_shorten)
+                    print(f"✅ 成功建立檔案: {input_file} (已覆蓋原檔)")
+            run_jobs(shorten_one, files_to_process, args.jobs or default_jobs(hwaccel), "縮短")
             print("所有縮短操作完成。")
             return
         elif args.slice:
@@ -893,20 +1583,19 @@ def main():
             if manual_output_name and len(files_to_process) > 1:
                 print("錯誤: 單獨切片 (-S) 並指定輸出檔名 (-n) 時，一次只能處理一個檔案。")
                 sys.exit(1)
+            def slice_output(input_file):
+                if manual_output_name:
+                    return manual_output_name
+                basename = os.path.splitext(os.path.basename(input_file))[0]
+                return f"{basename}-slice.mp4"
+            exit_if_outputs_exist(map(slice_output, files_to_process), args.overwrite)
             print(f"準備對 {len(files_to_process)} 個檔案執行獨立切片...")
            
-            for input_file in files_to_process:
-                if manual_output_name:
-                    output_file = manual_output_name
-                else:
-                    basename = os.path.splitext(os.path.basename(input_file))[0]
-                    output_file = f"{basename}-slice.mp4"
-               
-                try:
-                    slice_video(input_file, args.slice, output_file)
-                    print(f"✅ 成功建立檔案: {output_file}")
-                except subprocess.CalledProcessError as e:
-                    print(f"FFmpeg 切片失敗 for {input_file}: {e}")
+            def slice_one(input_file):
+                output_file = slice_output(input_file)
+                slice_video(input_file, args.slice, output_file, exact=args.exact, overwrite=args.overwrite)
+                print(f"✅ 成功建立檔案: {output_file}")
+            run_jobs(slice_one, files_to_process, args.jobs, "FFmpeg 切片")
            
             print("所有切片操作完成。")
             return
@@ -921,6 +1610,10 @@ def main():
             sys.exit(1)
             
         resolution = args.shrink
+        # 驗證解析度格式，例如 "1024x768"
+        if not _RES_RE.match(resolution):
+            print("錯誤: 解析度格式必須為 WxH，例如 640x480")
+            sys.exit(1)
         patterns = args.files.split()
        
         files_to_shrink = resolve_files(patterns, require_mp4=False)
@@ -928,12 +1621,10 @@ def main():
         if not files_to_shrink:
             print("錯誤: 沒有找到要縮小的檔案")
             sys.exit(1)
+        hwaccel = resolve_hwaccel(args.hwaccel, files_to_shrink[0], resolution)
            
-        for f in files_to_shrink:
-            try:
-                shrink_video(resolution, f)
-            except subprocess.CalledProcessError as e:
-                print(f"縮小失敗 {f}: {e}")
+        exit_if_outputs_exist((shrink_output_name(f, resolution) for f in files_to_shrink), args.overwrite)
+        run_jobs(lambda f: shrink_video(resolution, f, hwaccel, args.overwrite), files_to_shrink, args.jobs or default_jobs(hwaccel), "縮小")
         return
     # --- 5. 加字幕 模式 ---
     if args.text:
@@ -950,6 +1641,7 @@ def main():
             sys.exit(1)
             
         manual_output_name = args.name
+        hwaccel = resolve_hwaccel(args.hwaccel)
            
         patterns = args.files.split()
         files_to_process = resolve_files(patterns, require_mp4=True)
@@ -963,19 +1655,19 @@ def main():
             print("錯誤: 加字幕 (--text) 並指定輸出檔名 (-n) 時，一次只能處理一個檔案。")
             sys.exit(1)
                 
-        print(f"準備對 {len(files_to_process)} 個檔案添加字幕...")
-        for input_file in files_to_process:
+        def subtitle_output(input_file):
             if manual_output_name:
-                output_file = manual_output_name
-            else:
-                basename = os.path.splitext(os.path.basename(input_file))[0]
-                output_file = f"{basename}-subtitled.mp4"
-               
-            try:
-                add_subtitle(input_file, args.subtitle, output_file, args.font, args.pos, args.size)
-                print(f"✅ 成功建立檔案: {output_file}")
-            except subprocess.CalledProcessError as e:
-                print(f"添加字幕失敗 for {input_file}: {e}")
+                return manual_output_name
+            basename = os.path.splitext(os.path.basename(input_file))[0]
+            return f"{basename}-subtitled.mp4"
+        exit_if_outputs_exist(map(subtitle_output, files_to_process), args.overwrite)
+        print(f"準備對 {len(files_to_process)} 個檔案添加字幕...")
+        def subtitle_one(input_file):
+            output_file = subtitle_output(input_file)
+            add_subtitle(input_file, args.subtitle, output_file, args.font, args.pos, args.size, hwaccel,
+                         args.overwrite)
+            print(f"✅ 成功建立檔案: {output_file}")
+        run_jobs(subtitle_one, files_to_process, args.jobs or default_jobs(hwaccel), "添加字幕")
            
         print("所有添加字幕操作完成。")
         return
@@ -8,11 +8,20 @@ from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor
 import shutil
 
+VAAPI_DEVICE = "/dev/dri/renderD128"
+# Consumer GPUs only run a few encode sessions at once (NVENC is capped at 3-5), so hardware modes
+# default to this many concurrent files instead of scaling with the CPU core count
+GPU_JOBS = 2
+# Resolve the binaries once; every conversion then execs the absolute path directly
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
 def check_ffmpeg():
-    """Check if ffmpeg is installed."""
-    if not shutil.which("ffmpeg"):
-        print("Error: ffmpeg is not installed")
-        sys.exit(1)
+    """Check if ffmpeg and ffprobe are installed."""
+    for name, path in (("ffmpeg", FFMPEG), ("ffprobe", FFPROBE)):
+        if not path:
+            print(f"Error: {name} is not installed")
+            sys.exit(1)
 
 def validate_directories(src, dst):
     """Validate source and destination directories."""
@@ -30,29 +39,86 @@ def extract_date(filename):
     match = re.match(r'^(\d{8})', filename)
     return match.group(1) if match else None
 
-def process_file(file, dst, quiet_mode):
+def video_args(hwaccel, ffmpeg_threads):
+    """Return (options before -i, -vf filter chain, video codec options) for the chosen encoder."""
+    if hwaccel == "nvenc":
+        # Decode and scale on the GPU, download once for transpose, then encode with NVENC
+        return (["-hwaccel", "cuda", "-hwaccel_output_format", "cuda"],
+                "scale_cuda=720:1280,hwdownload,format=nv12,transpose=1",
+                ["-c:v", "h264_nvenc", "-preset", "p4", "-rc", "vbr", "-b:v", "4000k"])
+    if hwaccel == "qsv":
+        return (["-hwaccel", "qsv", "-hwaccel_output_format", "qsv"],
+                "scale_qsv=w=720:h=1280,hwdownload,format=nv12,transpose=1",
+                ["-c:v", "h264_qsv", "-b:v", "4000k"])
+    if hwaccel == "vaapi":
+        return (["-vaapi_device", VAAPI_DEVICE],
+                "scale=720:1280,transpose=1,format=nv12,hwupload",
+                ["-c:v", "h264_vaapi", "-b:v", "4000k"])
+    return ([], "scale=720:1280,transpose=1",
+            ["-c:v", "libvpx-vp9", "-b:v", "4000k", "-threads", str(ffmpeg_threads), "-row-mt", "1"])
+
+def get_duration(path):
+    """Return the container duration in seconds, or None if ffprobe cannot read it."""
+    result = subprocess.run(
+        [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def output_is_complete(file, output_file):
+    """An existing output counts as done only if it is non-trivial and as long as its source.
+    Interrupted conversions leave truncated files behind; those get converted again.
+    """
+    if output_file.stat().st_size <= 1024:
+        return False
+    src_dur, dst_dur = get_duration(file), get_duration(output_file)
+    return src_dur is not None and dst_dur is not None and abs(src_dur - dst_dur) < 0.5
+
+def plan_jobs(mp4_files, dst):
+    """Map each source file to its output path, skipping files that need no work.
+    Runs before the thread pool so workers only receive real conversions.
+    """
+    jobs = []
+    existing = []
+    for file in mp4_files:
+        filename = file.name
+        date_part = extract_date(filename)
+        if not date_part:
+            print(f"Warning: Skipping '{filename}' - no valid YYYYMMDD date found")
+            continue
+
+        # Create output directory
+        output_dir = Path(dst) / date_part
+        output_dir.mkdir(exist_ok=True)
+        output_file = output_dir / filename
+
+        if output_file.exists():
+            existing.append((file, output_file))
+        else:
+            jobs.append((file, output_file))
+
+    # Skip if output file exists and is complete; probe the existing pairs concurrently
+    with ThreadPoolExecutor() as executor:
+        complete = list(executor.map(lambda pair: output_is_complete(*pair), existing))
+    for (file, output_file), done in zip(existing, complete):
+        if done:
+            print(f"Skipping '{file.name}' - output file '{output_file}' already exists")
+        else:
+            print(f"Re-converting '{file.name}' - output file '{output_file}' looks incomplete")
+            jobs.append((file, output_file))
+    return jobs
+
+def process_file(file, output_file, quiet_mode, ffmpeg_threads, hwaccel="none"):
     """Process a single file with ffmpeg."""
     filename = file.name
-    date_part = extract_date(filename)
-    if not date_part:
-        print(f"Warning: Skipping '{filename}' - no valid YYYYMMDD date found")
-        return
-
-    # Create output directory
-    output_dir = Path(dst) / date_part
-    output_dir.mkdir(exist_ok=True)
-    output_file = output_dir / filename
-
-    # Skip if output file exists
-    if output_file.exists():
-        print(f"Skipping '{filename}' - output file '{output_file}' already exists")
-        return
 
     # Build ffmpeg command
-    ffmpeg_cmd = [
-        "ffmpeg", "-i", str(file),
-        "-c:v", "libvpx-vp9", "-b:v", "4000k",
-        "-vf", "scale=720:1280,transpose=1",
+    input_opts, vf, codec = video_args(hwaccel, ffmpeg_threads)
+    ffmpeg_cmd = [FFMPEG] + input_opts + ["-i", str(file)] + codec + [
+        "-vf", vf,
         "-c:a", "aac", "-b:a", "152k", "-ar", "44100", "-r", "30",
         "-f", "mp4", str(output_file), "-y"
     ]
@@ -89,7 +155,15 @@ def main():
     parser = argparse.ArgumentParser(description="Convert MP4 files using ffmpeg with multi-threading")
     parser.add_argument("-s", "--source", required=True, help="Source directory containing *.mp4 files")
     parser.add_argument("-d", "--destination", required=True, help="Destination directory for converted files")
-    parser.add_argument("-t", "--threads", type=int, default=cpu_cores, help="Number of concurrent threads")
+    parser.add_argument("-t", "--threads", type=int,
+                        help="Number of concurrent files (default: CPU cores / --ffmpeg-threads, "
+                             "or --gpu-jobs with --hwaccel)")
+    parser.add_argument("--ffmpeg-threads", type=int, default=2,
+                        help="Threads used by each libvpx-vp9 encoder; no effect with --hwaccel (default: 2)")
+    parser.add_argument("--gpu-jobs", type=int, default=GPU_JOBS,
+                        help=f"Number of concurrent files with --hwaccel (default: {GPU_JOBS})")
+    parser.add_argument("--hwaccel", choices=["nvenc", "qsv", "vaapi", "none"], default="none",
+                        help="Hardware H.264 encoder to use instead of libvpx-vp9 (default: none)")
     parser.add_argument("-q", "--quiet", action="store_true", help="Suppress all ffmpeg output")
     parser.add_argument("-D", "--date", help="Only convert files starting with this YYYYMMDD date")  # ✅ 新增
     args = parser.parse_args()
@@ -108,11 +182,21 @@ def main():
             print(f"No files found with date {args.date}")
             sys.exit(0)
 
+    jobs = plan_jobs(mp4_files, args.destination)
+
+    # Each libvpx ffmpeg uses --ffmpeg-threads threads, so run just enough of them to fill the CPU;
+    # hardware encoders are limited by the GPU's session count instead
+    ffmpeg_threads = max(1, args.ffmpeg_threads)
+    if args.hwaccel != "none":
+        max_workers = args.threads or max(1, args.gpu_jobs)
+    else:
+        max_workers = args.threads or max(1, cpu_cores // ffmpeg_threads)
+
     # Process files using ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = [
-            executor.submit(process_file, file, args.destination, args.quiet)
-            for file in mp4_files
+            executor.submit(process_file, file, output_file, args.quiet, ffmpeg_threads, args.hwaccel)
+            for file, output_file in jobs
         ]
         for future in futures:
             future.result()